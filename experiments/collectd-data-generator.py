@@ -20,88 +20,141 @@ python load_gen.py --servers 500 --rate 10 --duration 30
 
 # Custom endpoint
 python load_gen.py --servers 50 --url http://10.0.0.5:8080/metrics
+
+Note: the connection pool is unbounded, so each simulated server can hold its own
+socket open. Raise the open file limit before big runs, e.g. `ulimit -n 65535`
 """
 
 import argparse
 import asyncio
 import time
-import random
+from collections import Counter
 from typing import List, Dict
 import aiohttp
+import numpy as np
 import orjson
+import uvloop
+from yarl import URL
 
 
-def generate_collectd_metric(hostname: str, plugin: str = None) -> Dict:
-    """Generate a realistic collectd metric object"""
-    plugins = ["cpu", "memory", "disk", "network", "load"] # random plugins I've seen commonly used
-    types = ["gauge", "derive", "counter"] # random types I've seen commonly used
-    
-    plugin = plugin or random.choice(plugins)
-    
+PLUGINS = np.array(["cpu", "memory", "disk", "network", "load"]) # random plugins I've seen commonly used
+TYPES = np.array(["gauge", "derive", "counter"]) # random types I've seen commonly used
+PLUGIN_INSTANCES = np.array([str(i) for i in range(8)])
+
+_HEADERS = {"Content-Type": "application/json"}
+
+
+def make_metric_template(hostname: str) -> Dict:
+    """Build the per-server metric skeleton, generate_batch fills in the rest"""
     return {
         "host": hostname,
-        "plugin": plugin,
-        "plugin_instance": str(random.randint(0, 7)),
-        "type": random.choice(types),
+        "plugin": "cpu",
+        "plugin_instance": "0",
+        "type": "gauge",
         "type_instance": "value",
-        "time": time.time(),
+        "time": 0.0,
         "interval": 10.0,
-        "values": [random.random() * 100],
+        "values": [0.0],
         "dstypes": ["gauge"],
         "dsnames": ["value"]
     }
 
 
-def generate_batch(hostname: str, batch_size: int) -> List[Dict]:
+def generate_batch(template: Dict, batch_size: int, rng: np.random.Generator) -> List[Dict]:
     """Generate a batch of metrics from one server"""
-    return [generate_collectd_metric(hostname) for _ in range(batch_size)]
+    now = time.time()
+    values = (rng.random(batch_size) * 100).tolist()
+    plugin_instances = rng.choice(PLUGIN_INSTANCES, batch_size).tolist()
+    plugins = rng.choice(PLUGINS, batch_size).tolist()
+    types = rng.choice(TYPES, batch_size).tolist()
+    
+    batch = []
+    for value, plugin_instance, plugin, type_ in zip(values, plugin_instances, plugins, types):
+        # Shallow copy, dstypes/dsnames are shared and never mutated
+        metric = template.copy()
+        metric["plugin"] = plugin
+        metric["plugin_instance"] = plugin_instance
+        metric["type"] = type_
+        metric["time"] = now
+        metric["values"] = [value]
+        batch.append(metric)
+    return batch
 
 
 async def send_metrics(
     session: aiohttp.ClientSession,
-    url: str,
-    hostname: str,
+    url: URL,
+    template: Dict,
+    rng: np.random.Generator,
     batch_size: int,
     stats: Dict
 ):
     """Send one batch of metrics"""
-    batch = generate_batch(hostname, batch_size)
-    payload = orjson.dumps(batch)
+    batch = generate_batch(template, batch_size, rng)
+    payload = orjson.dumps(batch, option=orjson.OPT_SERIALIZE_NUMPY)
     
     start = time.perf_counter()
     try:
-        async with session.post(url, data=payload, headers={"Content-Type": "application/json"}) as resp:
+        async with session.post(url, data=payload, headers=_HEADERS) as resp:
             elapsed = time.perf_counter() - start
             
             if resp.status == 204 or resp.status == 200:
                 stats['success'] += 1
-                stats['latencies'].append(elapsed)
+                # Wraps around if the run outlives the buffer
+                i = stats['lat_i']
+                latencies = stats['latencies']
+                latencies[i % len(latencies)] = elapsed
+                stats['lat_i'] = i + 1
             else:
                 stats['errors'] += 1
-                print(f"Error from {hostname}: HTTP {resp.status}")
+                stats['errors_by_type'][f"HTTP {resp.status}"] += 1
     except Exception as e:
         stats['errors'] += 1
-        print(f"Exception from {hostname}: {e}")
+        stats['errors_by_type'][type(e).__name__] += 1
+
+
+async def error_monitor(stats: Dict, period: float = 1.0):
+    """
+    Print a summary of new errors once per period. Failures are only counted where
+    they happen, a print per failure would block the loop during an error storm
+    """
+    last = Counter()
+    while True:
+        await asyncio.sleep(period)
+        new = stats['errors_by_type'] - last
+        if new:
+            summary = ", ".join(f"{kind}: {count}" for kind, count in new.most_common())
+            print(f"Errors in the last {period:g}s: {summary}")
+            last = stats['errors_by_type'].copy()
 
 
 async def server_worker(
+    session: aiohttp.ClientSession,
     server_id: int,
-    url: str,
-    rate: float,
+    url: URL,
+    interval: float,
     batch_size: int,
     duration: int,
     stats: Dict
 ):
-    """Simulate one collectd server sending metrics at a given rate"""
+    """Simulate one collectd server sending metrics every interval seconds"""
     hostname = f"host-{server_id:04d}.void.void"
-    interval = 1.0 / rate if rate > 0 else 1.0
+    template = make_metric_template(hostname)
+    rng = np.random.default_rng()
     
-    async with aiohttp.ClientSession() as session:
-        end_time = time.time() + duration
-        
-        while time.time() < end_time:
-            await send_metrics(session, url, hostname, batch_size, stats)
-            await asyncio.sleep(interval)
+    # Pace against a deadline so time spent sending doesn't slow the rate down
+    deadline = time.monotonic()
+    end_time = deadline + duration
+    
+    while deadline < end_time:
+        await send_metrics(session, url, template, rng, batch_size, stats)
+        deadline += interval
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            # Fell behind, don't burst to catch up
+            deadline = time.monotonic()
 
 
 async def run_load_test(args):
@@ -115,22 +168,49 @@ async def run_load_test(args):
     print(f"  Total expected requests: {args.servers * args.rate * args.duration}")
     print()
     
+    # Non-positive rates fall back to one request per second per server
+    interval = 1.0 / args.rate if args.rate > 0 else 1.0
+    
     # Shared stats dictionary
     stats = {
         'success': 0,
         'errors': 0,
-        'latencies': []
+        'errors_by_type': Counter(),
+        # Preallocated for the expected number of requests, plus some slack
+        'latencies': np.empty(int(args.servers * args.duration / interval * 1.1) + 1024, dtype=np.float64),
+        'lat_i': 0
     }
     
-    start_time = time.time()
+    url = URL(args.url)
     
-    # Launch all server workers
-    tasks = [
-        server_worker(i, args.url, args.rate, args.metrics_per_batch, args.duration, stats)
-        for i in range(args.servers)
-    ]
+    # One connection pool for all simulated servers. aiohttp caps it at 100 connections
+    # by default, which throttles bigger runs and shows up as latency
+    connector = aiohttp.TCPConnector(
+        limit=0,
+        limit_per_host=0,
+        ttl_dns_cache=600,
+        enable_cleanup_closed=True,
+        force_close=False,
+        keepalive_timeout=120
+    )
     
-    await asyncio.gather(*tasks)
+    loop = asyncio.get_running_loop()
+    loop.set_task_factory(asyncio.eager_task_factory)
+    
+    start_time = time.time()
+    
+    async with aiohttp.ClientSession(connector=connector) as session:
+        # Launch all server workers
+        tasks = [
+            server_worker(session, i, url, interval, args.metrics_per_batch, args.duration, stats)
+            for i in range(args.servers)
+        ]
+        
+        monitor = asyncio.create_task(error_monitor(stats))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            monitor.cancel()
     
     elapsed = time.time() - start_time
     
@@ -142,17 +222,23 @@ async def run_load_test(args):
     print(f"Successful requests: {stats['success']}")
     print(f"Failed requests: {stats['errors']}")
     print(f"Total requests: {stats['success'] + stats['errors']}")
+    for kind, count in stats['errors_by_type'].most_common():
+        print(f"  {kind}: {count}")
     print()
     
-    if stats['latencies']:
-        latencies = sorted(stats['latencies'])
+    n = min(stats['lat_i'], len(stats['latencies']))
+    if n:
+        latencies = stats['latencies'][:n] * 1000
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
         print(f"Latency stats (seconds):")
-        print(f"  Min: {min(latencies)*1000:.2f}ms")
-        print(f"  Max: {max(latencies)*1000:.2f}ms")
-        print(f"  Mean: {sum(latencies)/len(latencies)*1000:.2f}ms")
-        print(f"  p50: {latencies[len(latencies)//2]*1000:.2f}ms")
-        print(f"  p95: {latencies[int(len(latencies)*0.95)]*1000:.2f}ms")
-        print(f"  p99: {latencies[int(len(latencies)*0.99)]*1000:.2f}ms")
+        if stats['lat_i'] > n:
+            print(f"  (buffer wrapped, stats cover the last {n} of {stats['lat_i']} requests)")
+        print(f"  Min: {latencies.min():.2f}ms")
+        print(f"  Max: {latencies.max():.2f}ms")
+        print(f"  Mean: {latencies.mean():.2f}ms")
+        print(f"  p50: {p50:.2f}ms")
+        print(f"  p95: {p95:.2f}ms")
+        print(f"  p99: {p99:.2f}ms")
     
     total_metrics = stats['success'] * args.metrics_per_batch
     print()
@@ -205,7 +291,8 @@ def main():
     args = parser.parse_args()
     
     try:
-        asyncio.run(run_load_test(args))
+        # uvloop.install() is deprecated on 3.12+
+        uvloop.run(run_load_test(args))
     except KeyboardInterrupt:
         print("\nTest interrupted by user")
 
@@ -12,7 +12,7 @@ It's also eaier for me to house this in my own repo.
 import socket
 import struct
 from datetime import datetime
-from copy import deepcopy
+from copy import copy
 import json
 #############################################################################
 
@@ -77,45 +77,71 @@ double = struct.Struct("<d")
 
 assert double.size == number.size == signed_number.size == 8
 
+_HDR_UNPACK = header.unpack_from
+_SHORT_UNPACK = short.unpack_from
+_NUMBER_UNPACK = number.unpack_from
+_DOUBLE_UNPACK = double.unpack_from
+_SIGNED_UNPACK = signed_number.unpack_from
+
 #############################################################################
 
+_header_size = header.size
 _values_header_size = header.size + short.size
 _single_value_size = 1 + 8  # type byte + value
 
-_ds_type_decoder = {
-    DS_TYPE_COUNTER:    number,
-    DS_TYPE_ABSOLUTE:   number,
-    DS_TYPE_DERIVE:     signed_number,
-    DS_TYPE_GAUGE:      double
+# Struct formats for n values of the same DS type, compiled per (dstype, n)
+_ds_type_run_format = {
+    DS_TYPE_COUNTER:    "!{}Q",
+    DS_TYPE_ABSOLUTE:   "!{}Q",
+    DS_TYPE_DERIVE:     "!{}q",
+    DS_TYPE_GAUGE:      "<{}d"
 }
+_ds_type_bytes = {dstype: bytes([dstype]) for dstype in _ds_type_run_format}
+_ds_type_run_cache = {}
+# Below this the per-value loop is faster
+_DS_TYPE_RUN_MIN_VALUES = 5
 
-def decode_network_values(ptype, plen, buf):
-    assert ptype == TYPE_VALUES
-
-    nvalues = short.unpack_from(buf, header.size)[0]
+def decode_network_values(buf, off, plen):
+    nvalues = _SHORT_UNPACK(buf, off + _header_size)[0]
     values_tot_size = _values_header_size + nvalues * _single_value_size
     if values_tot_size != plen:
         raise CollectdValueError(
             f"Values total size != Part len ({values_tot_size} vs {plen})"
         )
 
-    results = []
-    off = _values_header_size + nvalues
+    types_off = off + _values_header_size
+    val_off = types_off + nvalues
 
-    for dstype in buf[_values_header_size:off]:
-        try:
-            decoder = _ds_type_decoder[dstype]
-        except KeyError:
+    # Runs of a single DS type get unpacked in one call
+    if nvalues >= _DS_TYPE_RUN_MIN_VALUES:
+        dstype = buf[types_off]
+        run_format = _ds_type_run_format.get(dstype)
+        if run_format and buf.count(_ds_type_bytes[dstype], types_off, val_off) == nvalues:
+            key = (dstype, nvalues)
+            run = _ds_type_run_cache.get(key)
+            if run is None:
+                run = _ds_type_run_cache[key] = struct.Struct(run_format.format(nvalues))
+            return [(dstype, val) for val in run.unpack_from(buf, val_off)]
+
+    results = []
+    for i in range(nvalues):
+        dstype = buf[types_off + i]
+        if dstype == DS_TYPE_GAUGE:
+            decoder = _DOUBLE_UNPACK
+        elif dstype == DS_TYPE_COUNTER or dstype == DS_TYPE_ABSOLUTE:
+            decoder = _NUMBER_UNPACK
+        elif dstype == DS_TYPE_DERIVE:
+            decoder = _SIGNED_UNPACK
+        else:
             raise CollectdUnsupportedDSType(f"DS type {dstype} unsupported")
-        results.append((dstype, decoder.unpack_from(buf, off)[0]))
-        off += 8
+        results.append((dstype, decoder(buf, val_off + i * 8)[0]))
     return results
 
-def decode_network_number(ptype, plen, buf):
-    return number.unpack_from(buf, header.size)[0]
+def decode_network_number(buf, off, plen):
+    return _NUMBER_UNPACK(buf, off + _header_size)[0]
 
-def decode_network_string(ptype, plen, buf):
-    data = buf[header.size:plen-1]
+def decode_network_string(buf, off, plen):
+    data = buf[off + _header_size:off + plen - 1]
     return data.decode("utf-8", errors="ignore")
 
 _decoders = {
@@ -133,13 +159,18 @@ _decoders = {
     TYPE_INTERVALHR     : decode_network_number,
 }
 
-def decode_network_packet(buf):
+_DECODER_TABLE = [None] * (max(_decoders) + 1)
+for _ptype, _decoder in _decoders.items():
+    _DECODER_TABLE[_ptype] = _decoder
+del _ptype, _decoder
+
+def _decode_network_packet_py(buf):
     off = 0
     blen = len(buf)
 
     while off < blen:
         try:
-            ptype, plen = header.unpack_from(buf, off)
+            ptype, plen = _HDR_UNPACK(buf, off)
         except struct.error as err:
             raise CollectdDecodeError(err)
 
@@ -152,26 +183,40 @@ def decode_network_packet(buf):
                 f"Encoded part size greater than remaining data: buflen={blen} off={off} vsize={plen}"
             )
 
-        try:
-            decoder = _decoders[ptype]
-        except KeyError:
+        decoder = _DECODER_TABLE[ptype] if ptype < len(_DECODER_TABLE) else None
+        if decoder is None:
             raise CollectdUnsupportedMessageType(f"Part type {ptype} not recognized (off={off})")
 
         try:
-            res = decoder(ptype, plen, buf[off:])
+            res = decoder(buf, off, plen)
         except struct.error as err:
             raise CollectdDecodeError(err)
 
         yield ptype, res
         off += plen
 
+# Optional native decoder, see _collectd_decode.pyx for how to build it
+try:
+    from _collectd_decode import decode_network_packet as _decode_network_packet_native
+except ImportError:
+    _decode_network_packet_native = None
+
+def decode_network_packet(buf):
+    if _decode_network_packet_native is not None and isinstance(buf, bytes):
+        parts = _decode_network_packet_native(buf)
+        # None means it bailed, the Python decoder raises the actual error
+        if parts is not None:
+            return iter(parts)
+    return _decode_network_packet_py(buf)
+
 #############################################################################
 
+# cdtime_t is fixed point, the low 30 bits are in units of 2**-30 s
+_CDTIME_SCALE = 1.0 / (1 << 30)
+_CDTIME_FRAC_MASK = (1 << 30) - 1
+
 def cdtime_to_time(cdt):
-    sec = cdt >> 30
-    nsec = ((cdt & 0b111111111111111111111111111111) / 1.073741824) / 10**9
-    assert 0 <= nsec < 1
-    return sec + nsec
+    return (cdt >> 30) + (cdt & _CDTIME_FRAC_MASK) * _CDTIME_SCALE
 
 class Data(object):
     time = None
@@ -182,6 +227,9 @@ class Data(object):
     type = None
     typeinstance = None
 
+    # (fields it was built from, source string)
+    _source_cache = (None, "")
+
     def __init__(self, **kw):
         for k, v in kw.items():
             setattr(self, k, v)
@@ -192,15 +240,23 @@ class Data(object):
 
     @property
     def source(self):
-        res = []
-        if self.host:
-            res.append(self.host)
-        for attr in ('plugin', 'plugininstance', 'type', 'typeinstance'):
-            val = getattr(self, attr)
-            if val:
-                res.append("/")
-                res.append(val)
-        return ''.join(res)
+        key = (self.host, self.plugin, self.plugininstance, self.type, self.typeinstance)
+        cached_key, res = self._source_cache
+        if key != cached_key:
+            parts = [key[0]] if key[0] else []
+            for val in key[1:]:
+                if val:
+                    parts.append("/")
+                    parts.append(val)
+            res = ''.join(parts)
+            self._source_cache = (key, res)
+        return res
+
+    def __copy__(self):
+        # Attributes are all immutable, a shallow copy is enough
+        new = self.__class__.__new__(self.__class__)
+        new.__dict__.update(self.__dict__)
+        return new
 
     def __str__(self):
         return f"[{self.time}] {self.source}"
@@ -236,6 +292,11 @@ class Notification(Data):
         return f"{super().__str__()} [{self.severitystring}] {self.message}"
 
 class Values(Data, list):
+    def __copy__(self):
+        new = Data.__copy__(self)
+        new.extend(self)
+        return new
+
     def __str__(self):
         return f"{Data.__str__(self)} {list.__str__(self)}"
 
@@ -257,33 +318,35 @@ class Parser(object):
         vl = self.Values()
         nt = self.Notification()
 
+        # Most frequent kinds first, host/time/interval usually come once per packet
         for kind, data in iterable:
-            if kind == TYPE_TIME:
-                vl.time = nt.time = data
+            if kind == TYPE_VALUES:
+                vl[:] = data
+                yield copy(vl)
+            elif kind == TYPE_TYPE_INSTANCE:
+                vl.typeinstance = nt.typeinstance = data
+            elif kind == TYPE_TYPE:
+                vl.type = nt.type = data
+            elif kind == TYPE_PLUGIN_INSTANCE:
+                vl.plugininstance = nt.plugininstance = data
+            elif kind == TYPE_PLUGIN:
+                vl.plugin = nt.plugin = data
             elif kind == TYPE_TIMEHR:
-                vl.time = nt.time = cdtime_to_time(data)
-            elif kind == TYPE_INTERVAL:
-                vl.interval = data
-            elif kind == TYPE_INTERVALHR:
-                vl.interval = cdtime_to_time(data)
+                # cdtime_to_time, inlined
+                vl.time = nt.time = (data >> 30) + (data & _CDTIME_FRAC_MASK) * _CDTIME_SCALE
             elif kind == TYPE_HOST:
                 vl.host = nt.host = data
-            elif kind == TYPE_PLUGIN:
-                vl.plugin = nt.plugin = data
-            elif kind == TYPE_PLUGIN_INSTANCE:
-                vl.plugininstance = nt.plugininstance = data
-            elif kind == TYPE_TYPE:
-                vl.type = nt.type = data
-            elif kind == TYPE_TYPE_INSTANCE:
-                vl.typeinstance = nt.typeinstance = data
+            elif kind == TYPE_INTERVALHR:
+                vl.interval = (data >> 30) + (data & _CDTIME_FRAC_MASK) * _CDTIME_SCALE
+            elif kind == TYPE_TIME:
+                vl.time = nt.time = data
+            elif kind == TYPE_INTERVAL:
+                vl.interval = data
             elif kind == TYPE_SEVERITY:
                 nt.severity = data
             elif kind == TYPE_MESSAGE:
                 nt.message = data
-                yield deepcopy(nt)
-            elif kind == TYPE_VALUES:
-                vl[:] = data
-                yield deepcopy(vl)
+                yield copy(nt)
 
     def interpret(self, input=None):
         if isinstance(input, (type(None), str, bytes)):
@@ -6,6 +6,8 @@ A lightweight HTTP server that receives JSON metrics data from collectd's write_
 
 Usage:
     python3 collectd_http.py
+    python3 collectd_http.py --udp-port 25827   # collectd network endpoint on another port
+    python3 collectd_http.py --udp-port 0       # HTTP only, no collectd network endpoint
     Note: Will likely add more flags here for batch size, send port, receive port, and more....
 
 The server listens on http://0.0.0.0:6780/ and expects POST requests with JSON data
@@ -21,23 +23,38 @@ Collectd Configuration this code was tested with:
       </Node>
     </Plugin>
 
+By default it also listens on udp://0.0.0.0:25826 for collectd's native binary protocol, which is
+smaller on the wire and much cheaper to parse than JSON. Point the network plugin at it
+instead of write_http:
+
+    <Plugin network>
+      Server "your-server" "25826"
+    </Plugin>
+
 """
+import argparse
 import asyncio
+import io
+from collections import Counter
 from aiohttp import web
 import orjson
-from threading import Thread
-from queue import Queue
-import signal
-import sys
+import uvloop
+
+from collectd_binary_protocol_to_json import DEFAULT_PORT, CollectdException, Parser, Values
 
 
 OUTFILE = "/data/collectd.out"
 # This would have to change, likely a bigger batch size before we attempt to send, better yet, put this in a flag
 BATCH_SIZE = 10 
-batch_queue = Queue()
+batch_queue = asyncio.Queue()
 shutdown_event = asyncio.Event()
+writer_task = web.AppKey("writer_task", asyncio.Task)
+outfile = web.AppKey("outfile", io.FileIO)
+udp_port = web.AppKey("udp_port", int)
+udp_transport = web.AppKey("udp_transport", asyncio.DatagramTransport)
+drop_reporter_task = web.AppKey("drop_reporter_task", asyncio.Task)
 
-def udp_sender():
+async def udp_sender():
     """
     Out to udp worker. Would likely have to put this in a thread pool for better scaling
     """
@@ -45,47 +62,46 @@ def udp_sender():
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     
     buffer = []
+    buffered = 0
     while True:
-        item = batch_queue.get()
+        item = await batch_queue.get()
         if item is None:
             break
-        buffer.append(item)
+        count, lines = item
+        buffer.append(lines)
+        buffered += count
         
-        if len(buffer) >= BATCH_SIZE:
-            # Send batch as JSON array
-            data = orjson.dumps(buffer)
-            sock.sendto(data, ('localhost', 9999))
+        if buffered >= BATCH_SIZE:
+            # Send batch as newline delimited JSON
+            sock.sendto(b"".join(buffer), ('localhost', 9999))
             buffer.clear()
+            buffered = 0
     
     # Send remaining
     if buffer:
-        data = orjson.dumps(buffer)
-        sock.sendto(data, ('localhost', 9999))
+        sock.sendto(b"".join(buffer), ('localhost', 9999))
 
-def disk_writer():
+async def disk_writer(f):
     """
     disk write worker used for testing
     """
     buffer = []
+    buffered = 0
     while True:
-        item = batch_queue.get()
+        item = await batch_queue.get()
         if item is None:  # sentinel for shutdown
             break
-        buffer.append(item)
-        if len(buffer) >= BATCH_SIZE:
-            with open(OUTFILE, "ab") as f:
-                for m in buffer:
-                    f.write(orjson.dumps(m) + b"\n")
+        count, lines = item
+        buffer.append(lines)
+        buffered += count
+        if buffered >= BATCH_SIZE:
+            f.write(b"".join(buffer))
             buffer.clear()
+            buffered = 0
     
     # Flush remaining
     if buffer:
-        with open(OUTFILE, "ab") as f:
-            for m in buffer:
-                f.write(orjson.dumps(m) + b"\n")
-
-writer_thread = Thread(target=disk_writer, daemon=True)
-writer_thread.start()
+        f.write(b"".join(buffer))
 
 async def handle(request):
     """
@@ -130,38 +146,147 @@ async def handle(request):
             }
             measurements.append(obj)
     
-    for m in measurements:
-        batch_queue.put(m)
+    enqueue(measurements)
     
     return web.Response(text="OK\n")
 
+def enqueue(measurements):
+    """
+    Serialize a request's (or packet's) measurements and hand them to the writer
+    """
+    if measurements:
+        lines = b"".join([orjson.dumps(m) + b"\n" for m in measurements])
+        batch_queue.put_nowait((len(measurements), lines))
+
+class CollectdBinaryProtocol(asyncio.DatagramProtocol):
+    """
+    UDP receiver for collectd's network plugin, decodes the binary protocol
+    straight into the same measurements the HTTP handler produces
+    """
+    def __init__(self):
+        self.parser = Parser()
+        self.dropped = Counter()
+
+    def datagram_received(self, data, addr):
+        try:
+            records = list(self.parser.interpret(data))
+        except CollectdException as err:
+            self.dropped[type(err).__name__] += 1
+            return
+        
+        # Notifications have no values, only keep value lists
+        measurements = [
+            {
+                "time": vl.time,
+                "host": vl.host,
+                "plugin": vl.plugin,
+                "plugin_instance": vl.plugininstance,
+                "type": vl.type,
+                "type_instance": vl.typeinstance,
+                "value": value
+            }
+            for vl in records if isinstance(vl, Values)
+            for _, value in vl
+        ]
+        enqueue(measurements)
+
+async def drop_reporter(protocol, period=10.0):
+    """
+    Print a summary of newly dropped packets once per period
+    """
+    last = Counter()
+    while True:
+        await asyncio.sleep(period)
+        new = protocol.dropped - last
+        if new:
+            summary = ", ".join(f"{kind}: {count}" for kind, count in new.most_common())
+            print(f"Dropped collectd packets in the last {period:g}s: {summary}")
+            last = protocol.dropped.copy()
+
+async def enable_eager_tasks(app):
+    """
+    Eager tasks, only available on Python 3.12+
+    """
+    if hasattr(asyncio, "eager_task_factory"):
+        asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
+
 app = web.Application()
 # This would likely have to change for a cleaner setup?
 app.add_routes([
     web.post('/', handle),
     web.post('/collectd', handle)
 ])
+app.on_startup.append(enable_eager_tasks)
+
 
+async def start_writer(app):
+    """
+    Open the output file and spawn the disk writer on the app's event loop
+    """
+    # Opened here so a bad OUTFILE fails startup
+    app[outfile] = open(OUTFILE, "ab", buffering=0)
+    app[writer_task] = asyncio.create_task(disk_writer(app[outfile]))
 
-async def shutdown_handler():
+async def stop_writer(app):
     """
-    Shutdown
+    Shutdown, let the disk writer drain and flush before the loop goes away
     """
     print("\nShutting down gracefully...")
-    batch_queue.put(None)  # Signal disk writer to stop
-    writer_thread.join()
-    sys.exit(0)
+    batch_queue.put_nowait(None)  # Signal disk writer to stop
+    try:
+        await app[writer_task]
+    finally:
+        app[outfile].close()
 
-def signal_handler():
-    asyncio.create_task(shutdown_handler())
+async def start_udp_listener(app):
+    """
+    Bind the collectd binary protocol endpoint on the app's event loop, port 0 turns it off
+    """
+    port = app.get(udp_port, DEFAULT_PORT)
+    if not port:
+        return
+    loop = asyncio.get_running_loop()
+    app[udp_transport], protocol = await loop.create_datagram_endpoint(
+        CollectdBinaryProtocol, local_addr=("0.0.0.0", port)
+    )
+    app[drop_reporter_task] = asyncio.create_task(drop_reporter(protocol))
 
-if __name__ == "__main__":
+async def stop_udp_listener(app):
+    """
+    Stop taking packets before the disk writer gets its shutdown sentinel
+    """
+    if udp_transport in app:
+        app[udp_transport].close()
+        app[drop_reporter_task].cancel()
+
+app.on_startup.append(start_writer)
+app.on_startup.append(start_udp_listener)
+app.on_cleanup.append(stop_udp_listener)
+app.on_cleanup.append(stop_writer)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Receive collectd metrics over HTTP (JSON) and UDP (binary protocol)",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    
+    parser.add_argument(
+        "--udp-port",
+        type=int,
+        default=DEFAULT_PORT,
+        help="UDP port for collectd's network plugin, 0 disables the UDP endpoint"
+    )
+    
+    args = parser.parse_args()
+    app[udp_port] = args.udp_port
+    
     print("Listening for Collectd JSON on http://0.0.0.0:6780/")
+    if args.udp_port:
+        print(f"Listening for Collectd binary protocol on udp://0.0.0.0:{args.udp_port}")
     
-    try:
-        web.run_app(app, host="0.0.0.0", port=6780)
-    except KeyboardInterrupt:
-        print("\nShutting down gracefully...")
-    finally:
-        batch_queue.put(None)
-        writer_thread.join()
+    # run_app handles SIGINT/SIGTERM itself and runs the cleanup hooks above
+    web.run_app(app, host="0.0.0.0", port=6780, loop=uvloop.new_event_loop())
+
+
+if __name__ == "__main__":
+    main()